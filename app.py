@@ -1,10 +1,16 @@
+import os
+import tempfile
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from sqlalchemy import text
 from utilities.DB_connection import make_sqlalchemy_db_connection
 from utilities.utility import get_message, clear_messages
 from utilities.manual_upload import handle_manual_upload, cleanup_uploaded_files
+from etl.sketch import sketch_histogram, sketch_quantiles, sketch_summary
+from utilities.export import usage_range_params, write_usage_export
+from utilities.config import SKETCH_BIN_WIDTHS
 
 # Page config
 st.set_page_config(page_title="Skylink Usage Dashboard", layout="wide", page_icon="📈")
@@ -12,21 +18,98 @@ st.set_page_config(page_title="Skylink Usage Dashboard", layout="wide", page_ico
 # Fetch data from database
 @st.cache_resource # Cache the database connection
 def get_db_connection():
-    return make_sqlalchemy_db_connection()
+    return make_sqlalchemy_db_connection(read_only=True)
 
 def load_daily_usage(_connection, start_date, end_date=None):
     query = """
-        SELECT * FROM public."USAGE"
-        WHERE "timestamp"::date BETWEEN %(start_date)s AND %(end_date)s;
+        SELECT * FROM "USAGE"
+        WHERE "timestamp" >= :start_ts AND "timestamp" < :end_ts;
     """
     try:
         @st.cache_data(ttl=600)  # Cache the query result for 10 minutes
         def fetch_data(_connection, query, start_date, end_date):
-            return pd.read_sql_query(query, _connection, params={"start_date": start_date, "end_date": end_date or start_date})
+            return pd.read_sql_query(text(query), _connection, params=usage_range_params(start_date, end_date), parse_dates=["timestamp"])
         return fetch_data(_connection, query, start_date, end_date)
     except Exception as e:
         return pd.DataFrame()  # Return empty DataFrame on error
 
+def load_distribution_sketch(_connection, start_date, end_date=None):
+    # Per-day sketches merged across the range in the database (sum counts, min of mins, ...)
+    query = """
+        SELECT metric, bin_index, bin_width,
+               SUM(value_count) AS value_count, SUM(value_sum) AS value_sum,
+               MIN(min_value) AS min_value, MAX(max_value) AS max_value
+        FROM "USAGE_SKETCH"
+        WHERE usage_date BETWEEN :start_date AND :end_date
+        GROUP BY metric, bin_index, bin_width;
+    """
+    try:
+        @st.cache_data(ttl=600)  # Cache the query result for 10 minutes
+        def fetch_sketch(_connection, query, start_date, end_date):
+            return pd.read_sql_query(text(query), _connection, params={"start_date": start_date, "end_date": end_date or start_date})
+        return fetch_sketch(_connection, query, start_date, end_date)
+    except Exception as e:
+        return pd.DataFrame()  # Return empty DataFrame on error (e.g. sketches not built yet)
+
+def load_usage_page(_connection, start_date, end_date, min_usage, cursor=None, page_size=100):
+    # Keyset pagination: resume after the last row of the previous page instead of OFFSET
+    query = """
+        SELECT msisdn, session_id, "timestamp", total_usage_mb, avg_throughput, latency_ms, duration_ms
+        FROM "USAGE"
+        WHERE "timestamp" >= :start_ts AND "timestamp" < :end_ts
+          AND total_usage_mb >= :min_usage
+          {after_cursor}
+        ORDER BY "timestamp" DESC, session_id DESC, msisdn DESC
+        LIMIT :page_size;
+    """
+    params = usage_range_params(start_date, end_date, min_usage)
+    params["page_size"] = page_size
+    after_cursor = ""
+    if cursor is not None:
+        # Spelled out instead of a row-value comparison, which DuckDB rejects across mixed types
+        after_cursor = (
+            'AND "timestamp" <= :cursor_ts AND ("timestamp" < :cursor_ts OR ("timestamp" = :cursor_ts AND '
+            '(session_id < :cursor_session OR (session_id = :cursor_session AND msisdn < :cursor_msisdn))))'
+        )
+        params.update({"cursor_ts": cursor[0], "cursor_session": cursor[1], "cursor_msisdn": cursor[2]})
+    try:
+        return pd.read_sql_query(text(query.format(after_cursor=after_cursor)), _connection, params=params, parse_dates=["timestamp"])
+    except Exception as e:
+        return pd.DataFrame()  # Return empty DataFrame on error
+
+def load_metric_counts(_connection, start_date, end_date=None):
+    # Non-null values per sketched metric in the range, counted in the database
+    query = f"""
+        SELECT {', '.join(f'COUNT({metric}) AS {metric}' for metric in SKETCH_BIN_WIDTHS)}
+        FROM "USAGE"
+        WHERE "timestamp" >= :start_ts AND "timestamp" < :end_ts;
+    """
+    try:
+        @st.cache_data(ttl=600)  # Cache the query result for 10 minutes
+        def fetch_counts(_connection, query, start_date, end_date):
+            return pd.read_sql_query(text(query), _connection, params=usage_range_params(start_date, end_date))
+        return fetch_counts(_connection, query, start_date, end_date).iloc[0].to_dict()
+    except Exception as e:
+        return {}  # Return no counts on error, so the panels use the raw rows
+
+def sketch_covers_rows(sketch, metric_counts):
+    # Only stand in for the rows if the sketch counts every one of them (days loaded before the sketches
+    # existed have none until `python main.py backfill-sketches` is run)
+    if sketch.empty or not metric_counts:
+        return False
+    return all(sketch_summary(sketch, metric)['count'] == count for metric, count in metric_counts.items())
+
+def sketch_histogram_figure(hist, color):
+    # Pre-binned histogram drawn as touching bars
+    fig = go.Figure(go.Bar(
+        x=(hist['bin_start'] + hist['bin_end']) / 2,
+        y=hist['frequency'],
+        width=hist['bin_end'] - hist['bin_start'],
+        marker_color=color
+    ))
+    fig.update_layout(bargap=0)
+    return fig
+
 db_connection = get_db_connection()
 
 clear_messages()  # Clear previous messages
@@ -74,6 +157,13 @@ filtered_data = daily_usage.copy()
 if min_usage > 0:
     filtered_data = filtered_data[filtered_data['total_usage_mb'] >= min_usage]
 
+# Distribution panels use the stored sketches unless a row-level filter is active
+distribution_sketch = load_distribution_sketch(db_connection, start_date_input, end_date_input) if min_usage == 0 else pd.DataFrame()
+use_sketches = (
+    not distribution_sketch.empty
+    and sketch_covers_rows(distribution_sketch, load_metric_counts(db_connection, start_date_input, end_date_input))
+)
+
 # Main Dashboard
 date_range = f"{start_date_input} to {end_date_input}" if (end_date_input != start_date_input) else f"{start_date_input}"
 st.title(f"📈 Skylink Usage Dashboard {date_range}")
@@ -184,24 +274,39 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("🚀 Throughput Distribution")
-    fig_throughput = px.histogram(
-        filtered_data, 
-        x='avg_throughput',
-        nbins=30,
-        labels={'avg_throughput': 'Throughput (Mbps)'},
-        color_discrete_sequence=['teal']
-    )
+    if use_sketches:
+        fig_throughput = sketch_histogram_figure(sketch_histogram(distribution_sketch, 'avg_throughput', nbins=30), 'teal')
+    else:
+        fig_throughput = px.histogram(
+            filtered_data, 
+            x='avg_throughput',
+            nbins=30,
+            labels={'avg_throughput': 'Throughput (Mbps)'},
+            color_discrete_sequence=['teal']
+        )
     fig_throughput.update_layout(xaxis_title="Throughput (Mbps)", yaxis_title="Frequency")
     st.plotly_chart(fig_throughput, use_container_width=True)
 
 with col2:
     st.subheader("📡 Latency Distribution")
-    fig_latency = px.box(
-        filtered_data, 
-        y='latency_ms',
-        labels={'latency_ms': 'Latency (ms)'},
-        color_discrete_sequence=['salmon']
-    )
+    if use_sketches:
+        q1, median, q3 = sketch_quantiles(distribution_sketch, 'latency_ms', [0.25, 0.5, 0.75])
+        latency_stats = sketch_summary(distribution_sketch, 'latency_ms')
+        iqr = q3 - q1
+        fig_latency = go.Figure(go.Box(
+            q1=[q1], median=[median], q3=[q3], mean=[latency_stats['mean']],
+            lowerfence=[max(latency_stats['min'], q1 - 1.5 * iqr)],
+            upperfence=[min(latency_stats['max'], q3 + 1.5 * iqr)],
+            name='latency_ms',
+            marker_color='salmon'
+        ))
+    else:
+        fig_latency = px.box(
+            filtered_data, 
+            y='latency_ms',
+            labels={'latency_ms': 'Latency (ms)'},
+            color_discrete_sequence=['salmon']
+        )
     fig_latency.update_layout(yaxis_title="Latency (ms)")
     st.plotly_chart(fig_latency, use_container_width=True)
 
@@ -212,14 +317,17 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("⏱️ Session Duration Distribution")
-    filtered_data['duration_sec'] = filtered_data['duration_ms'] / 1000
-    fig_duration = px.histogram(
-        filtered_data, 
-        x='duration_sec',
-        nbins=30,
-        labels={'duration_sec': 'Duration (seconds)'},
-        color_discrete_sequence=['purple']
-    )
+    if use_sketches:
+        fig_duration = sketch_histogram_figure(sketch_histogram(distribution_sketch, 'duration_ms', nbins=30, scale=1 / 1000), 'purple')
+    else:
+        filtered_data['duration_sec'] = filtered_data['duration_ms'] / 1000
+        fig_duration = px.histogram(
+            filtered_data, 
+            x='duration_sec',
+            nbins=30,
+            labels={'duration_sec': 'Duration (seconds)'},
+            color_discrete_sequence=['purple']
+        )
     fig_duration.update_layout(xaxis_title="Duration (seconds)", yaxis_title="Frequency")
     st.plotly_chart(fig_duration, use_container_width=True)
 
@@ -251,46 +359,110 @@ with col1:
         st.write(f"- Total Usage: {filtered_data['total_usage_mb'].sum():.2f} MB")
         st.write(f"- Avg per Session: {filtered_data['total_usage_mb'].mean():.2f} MB")
 
+# Min/max/mean straight from the sketches when available (exact, not approximated)
+if use_sketches:
+    duration_stats = sketch_summary(distribution_sketch, 'duration_ms')
+    throughput_stats = sketch_summary(distribution_sketch, 'avg_throughput')
+    latency_stats = sketch_summary(distribution_sketch, 'latency_ms')
+else:
+    duration_stats = {'mean': filtered_data['duration_ms'].mean(), 'max': filtered_data['duration_ms'].max(), 'min': filtered_data['duration_ms'].min()} if 'duration_ms' in filtered_data.columns else None
+    throughput_stats = {'mean': filtered_data['avg_throughput'].mean(), 'max': filtered_data['avg_throughput'].max()} if 'avg_throughput' in filtered_data.columns else None
+    latency_stats = {'min': filtered_data['latency_ms'].min(), 'max': filtered_data['latency_ms'].max()} if 'latency_ms' in filtered_data.columns else None
+
 with col2:
     st.markdown("**Session Metrics**")
-    if 'duration_ms' in filtered_data.columns:
-        st.write(f"- Avg Duration: {filtered_data['duration_ms'].mean() / 1000:.1f} sec")
-        st.write(f"- Max Duration: {filtered_data['duration_ms'].max() / 1000:.1f} sec")
-        st.write(f"- Min Duration: {filtered_data['duration_ms'].min() / 1000:.1f} sec")
+    if duration_stats:
+        st.write(f"- Avg Duration: {duration_stats['mean'] / 1000:.1f} sec")
+        st.write(f"- Max Duration: {duration_stats['max'] / 1000:.1f} sec")
+        st.write(f"- Min Duration: {duration_stats['min'] / 1000:.1f} sec")
 
 with col3:
     st.markdown("**Network Performance**")
-    if 'avg_throughput' in filtered_data.columns:
-        st.write(f"- Max Throughput: {filtered_data['avg_throughput'].max():.2f} Mbps")
-        st.write(f"- Avg Throughput: {filtered_data['avg_throughput'].mean():.2f} Mbps")
-    if 'latency_ms' in filtered_data.columns:
-        st.write(f"- Min Latency: {filtered_data['latency_ms'].min():.1f} ms")
-        st.write(f"- Max Latency: {filtered_data['latency_ms'].max():.1f} ms")
+    if throughput_stats:
+        st.write(f"- Max Throughput: {throughput_stats['max']:.2f} Mbps")
+        st.write(f"- Avg Throughput: {throughput_stats['mean']:.2f} Mbps")
+    if latency_stats:
+        st.write(f"- Min Latency: {latency_stats['min']:.1f} ms")
+        st.write(f"- Max Latency: {latency_stats['max']:.1f} ms")
 
 st.markdown("---")
 
-# Data Table
+def discard_prepared_export():
+    # Delete the temp file behind an export once it is served or outdated
+    prepared_export = st.session_state.pop('prepared_export', None)
+    if prepared_export and os.path.exists(prepared_export[1]):
+        os.remove(prepared_export[1])
+
+# Data Table (one page at a time, newest first)
 st.subheader("📄 Detailed Usage Data")
+page_size = 100
+table_filter = (start_date_input, end_date_input, min_usage)
+if st.session_state.get('table_filter') != table_filter:
+    # Filters changed: restart from the first page and drop any prepared export
+    st.session_state['table_filter'] = table_filter
+    st.session_state['table_cursors'] = [None]
+    discard_prepared_export()
+
+table_cursors = st.session_state['table_cursors']
+usage_page = load_usage_page(db_connection, start_date_input, end_date_input, min_usage, table_cursors[-1], page_size)
 st.dataframe(
-    filtered_data[['msisdn', 'timestamp', 'total_usage_mb', 
-                   'avg_throughput', 'latency_ms', 'duration_ms']].sort_values('timestamp', ascending=False),
+    usage_page[['msisdn', 'timestamp', 'total_usage_mb',
+                'avg_throughput', 'latency_ms', 'duration_ms']] if not usage_page.empty else usage_page,
     use_container_width=True,
     height=400
 )
 
+def next_table_page(last_row):
+    # Timestamp as an ISO string with microseconds, which every backend compares correctly
+    cursor_ts = pd.Timestamp(last_row['timestamp']).isoformat(sep=' ', timespec='microseconds')
+    st.session_state['table_cursors'].append((cursor_ts, last_row['session_id'], last_row['msisdn']))
+
+def previous_table_page():
+    st.session_state['table_cursors'].pop()
+
+col1, col2, col3 = st.columns([1, 1, 4])
+with col1:
+    st.button("⬅️ Previous", disabled=len(table_cursors) <= 1, on_click=previous_table_page)
+with col2:
+    st.button(
+        "Next ➡️",
+        disabled=len(usage_page) < page_size,
+        on_click=next_table_page,
+        args=(usage_page.iloc[[-1]].to_dict('records')[0],) if not usage_page.empty else None
+    )
+with col3:
+    st.caption(f"Page {len(table_cursors)}")
+
 # Download Section
 st.markdown("---")
 st.subheader("💾 Download Data")
 col1, col2 = st.columns(2)
 
 with col1:
-    csv = filtered_data.to_csv(index=False).encode('utf-8')
-    st.download_button(
-        label="📥 Download Filtered Data as CSV",
-        data=csv,
-        file_name=f"usage_data_{date_range}.csv",
-        mime="text/csv"
-    )
+    # The export is only built on request, streamed from the database in chunks into a temp file
+    # (session state only keeps its path, and the file is deleted once downloaded)
+    export_format = st.radio("Format", ["csv", "parquet"], horizontal=True)
+    if st.button("Prepare Filtered Data Export"):
+        with st.spinner("Exporting usage data..."):
+            discard_prepared_export()
+            export_file = tempfile.NamedTemporaryFile(suffix=f".{export_format}", delete=False)
+            try:
+                with export_file:
+                    write_usage_export(db_connection, export_file, start_date_input, end_date_input, min_usage, export_format)
+                st.session_state['prepared_export'] = (export_format, export_file.name)
+            except Exception as e:
+                os.remove(export_file.name)
+                st.error(f"Could not export the usage data: {e}")
+    prepared_export = st.session_state.get('prepared_export')
+    if prepared_export and os.path.exists(prepared_export[1]):
+        with open(prepared_export[1], 'rb') as export_file:
+            st.download_button(
+                label=f"📥 Download Filtered Data as {prepared_export[0].upper()}",
+                data=export_file,
+                file_name=f"usage_data_{date_range}.{prepared_export[0]}",
+                mime="text/csv" if prepared_export[0] == 'csv' else "application/octet-stream",
+                on_click=discard_prepared_export
+            )
 
 with col2:
     # Summary stats download
@@ -1,6 +1,11 @@
 from pathlib import Path
 from utilities.config import RAW_DATA_DIR
-from utilities.utility import read_df
+from utilities.utility import read_df, read_df_chunks
+
+def _source_key(path):
+    df_key = Path(path).stem.split('/')[-1]  # Use the file name without extension
+    # get the key word roaming, usage, sessions as the key for the file that contains the word and assign it as the key.
+    return 'roaming' if 'roaming' in df_key else 'usage' if 'usage' in df_key else 'sessions' if 'sessions' in df_key else df_key
 
 def extract_all_data(file_paths): # Note: file_paths is a list of file paths and only csv, json, and excel files are supported
     print("Initiating data extraction..........................")
@@ -10,11 +15,25 @@ def extract_all_data(file_paths): # Note: file_paths is a list of file paths and
     print("Extracting data from files..........................")
     for path in file_paths:
         df = read_df(f"{RAW_DATA_DIR}/{path}")
-        df_key = Path(path).stem.split('/')[-1]  # Use the file name without extension
-        # get the key word roaming, usage, sessions as the key for the file that contains the word and assign it as the key.
-        df_key = 'roaming' if 'roaming' in df_key else 'usage' if 'usage' in df_key else 'sessions' if 'sessions' in df_key else df_key
+        df_key = _source_key(path)
         data_frames[df_key] = df
         print(f"Extracted {df_key} data with {len(df)} records.")
     print("Data extraction complete..........................")
     return data_frames
 
+def iter_usage_chunks(file_paths, chunksize):
+    """Yields (file name, chunk) for the usage files only; the other sources are not loaded."""
+    if not file_paths or len(file_paths) == 0:
+        raise ValueError("The list of file paths is empty.")
+    for path in usage_files(file_paths):
+        for chunk in read_df_chunks(f"{RAW_DATA_DIR}/{path}", chunksize):
+            yield path, chunk
+
+def usage_files(file_paths):
+    """Returns the raw files that hold usage data (the only source that is loaded)."""
+    return [path for path in file_paths if _source_key(path) == 'usage']
+
+def source_fingerprint(path):
+    """Size and modification time of a raw file; a changed file invalidates its load checkpoint."""
+    stat = Path(f"{RAW_DATA_DIR}/{path}").stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
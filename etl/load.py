@@ -1,56 +1,268 @@
 
+import datetime as dt
 import traceback
+from sqlalchemy import inspect, text
+from utilities.config import LOAD_BATCH_SIZE, SKETCH_BIN_WIDTHS
+from utilities.storage import (
+    create_table_from_frame, date_expr, floor_expr, has_index, insert_ignoring_duplicates, row_id_column, table_columns
+)
 
-def insert_data_to_db_sqlalchemy(engine, cleaned_data):
+USAGE_KEY = ['msisdn', 'session_id', 'timestamp']
+
+
+def usage_day_range(usage_df):
+    """First and last calendar day covered by a usage frame, or None if it has no timestamps."""
+    if usage_df is None or 'timestamp' not in usage_df.columns:
+        return None
+    timestamps = usage_df['timestamp'].dropna()
+    if timestamps.empty:
+        return None
+    return timestamps.min().date(), timestamps.max().date()
+
+
+def _rebuild_usage_sketches(conn, first_day, last_day):
+    """
+        Rebuild the stored distribution sketches for every day in [first_day, last_day]
+        from the rows actually in USAGE, so they describe the table and not the last file loaded.
+    """
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE IF NOT EXISTS "USAGE_SKETCH" (
+            usage_date DATE NOT NULL,
+            metric TEXT NOT NULL,
+            bin_index BIGINT NOT NULL,
+            bin_width DOUBLE PRECISION NOT NULL,
+            value_count BIGINT NOT NULL,
+            value_sum DOUBLE PRECISION NOT NULL,
+            min_value DOUBLE PRECISION NOT NULL,
+            max_value DOUBLE PRECISION NOT NULL
+        );
+        """
+    )
+    conn.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS idx_usage_sketch_date_metric '
+        'ON "USAGE_SKETCH" (usage_date, metric)'
+    )
+
+    day_range = {
+        "first_day": first_day.isoformat(),
+        "last_day": last_day.isoformat(),
+        "start_ts": first_day.isoformat(),
+        "end_ts": (last_day + dt.timedelta(days=1)).isoformat()
+    }
+    conn.execute(text('DELETE FROM "USAGE_SKETCH" WHERE usage_date >= :first_day AND usage_date <= :last_day'), day_range)
+
+    usage_columns = table_columns(conn, 'USAGE')
+    usage_day = date_expr(conn, '"timestamp"')
+    for metric, bin_width in SKETCH_BIN_WIDTHS.items():
+        if metric not in usage_columns:
+            continue
+        bin_index = floor_expr(conn, f'metric_value / {float(bin_width)!r}')
+        conn.execute(
+            text(
+                f"""
+                INSERT INTO "USAGE_SKETCH"
+                    (usage_date, metric, bin_index, bin_width, value_count, value_sum, min_value, max_value)
+                SELECT usage_day, '{metric}', {bin_index}, {float(bin_width)!r},
+                       COUNT(*), SUM(metric_value), MIN(metric_value), MAX(metric_value)
+                FROM (
+                    SELECT {usage_day} AS usage_day, CAST({metric} AS DOUBLE PRECISION) AS metric_value
+                    FROM "USAGE"
+                    WHERE "timestamp" >= :start_ts AND "timestamp" < :end_ts AND {metric} IS NOT NULL
+                ) metric_values
+                GROUP BY usage_day, {bin_index};
+                """
+            ),
+            day_range
+        )
+    print(f"Distribution sketches rebuilt from USAGE for {first_day} to {last_day}")
+    return None
+
+
+def _ensure_usage_indexes(conn):
+    """Ensure the unique key every batch insert relies on, plus the dashboard's timestamp index."""
+    if not has_index(conn, 'USAGE', 'idx_usage_msisdn_session_ts'):
+        # Remove any existing duplicates in the table to allow unique index creation
+        row_id = row_id_column(conn)  # ctid on PostgreSQL, rowid on DuckDB/SQLite
+        conn.exec_driver_sql(
+            f"""
+            DELETE FROM "USAGE"
+            WHERE {row_id} IN (
+                SELECT {row_id} FROM (
+                    SELECT {row_id}, ROW_NUMBER() OVER (
+                        PARTITION BY msisdn, session_id, "timestamp"
+                        ORDER BY {row_id}
+                    ) AS rn
+                    FROM "USAGE"
+                ) ranked
+                WHERE rn > 1
+            );
+            """
+        )
+        print("Removed duplicate rows in table before enforcing uniqueness")
+
+        # Enforce uniqueness on the key columns to prevent duplicates on reruns
+        conn.exec_driver_sql(
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_usage_msisdn_session_ts '
+            'ON "USAGE" (msisdn, session_id, "timestamp")'
+        )
+        print("Unique index ensured on (msisdn, session_id, timestamp)")
+
+    # Index backing the dashboard's newest-first keyset pagination and range exports
+    # (DuckDB prunes timestamp ranges with its zone maps; an extra index would only slow ingestion)
+    if conn.dialect.name != 'duckdb':
+        conn.exec_driver_sql(
+            'CREATE INDEX IF NOT EXISTS idx_usage_ts_session_msisdn '
+            'ON "USAGE" ("timestamp" DESC, session_id DESC, msisdn DESC)'
+        )
+    return None
+
+
+def _prepare_usage_load(conn):
+    """Create the checkpoint table and make sure an existing USAGE table has its unique key."""
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE IF NOT EXISTS "ETL_CHECKPOINT" (
+            source_file TEXT PRIMARY KEY,
+            file_fingerprint TEXT NOT NULL,
+            rows_committed BIGINT NOT NULL,
+            updated_at TIMESTAMP NOT NULL,
+            completed BOOLEAN DEFAULT FALSE
+        );
+        """
+    )
+    if 'completed' not in table_columns(conn, 'ETL_CHECKPOINT'):
+        # Checkpoint tables from before completed files were tracked
+        conn.exec_driver_sql('ALTER TABLE "ETL_CHECKPOINT" ADD COLUMN completed BOOLEAN DEFAULT FALSE')
+    if inspect(conn).has_table('USAGE'):
+        _ensure_usage_indexes(conn)
+    return None
+
+
+def _read_checkpoint(conn, source, fingerprint) -> int:
+    """Return the high-water mark (raw rows already committed) for a source file, 0 if it changed."""
+    row = conn.execute(
+        text('SELECT file_fingerprint, rows_committed FROM "ETL_CHECKPOINT" WHERE source_file = :source'),
+        {"source": source}
+    ).first()
+    if row is None or row[0] != fingerprint:
+        return 0
+    return int(row[1])
+
+
+def _save_checkpoint(conn, source, fingerprint, rows_committed):
+    conn.execute(
+        text(
+            """
+            INSERT INTO "ETL_CHECKPOINT" (source_file, file_fingerprint, rows_committed, updated_at, completed)
+            VALUES (:source, :fingerprint, :rows_committed, :updated_at, FALSE)
+            ON CONFLICT (source_file) DO UPDATE SET
+                file_fingerprint = EXCLUDED.file_fingerprint,
+                rows_committed = EXCLUDED.rows_committed,
+                updated_at = EXCLUDED.updated_at,
+                completed = FALSE;
+            """
+        ),
+        {
+            "source": source,
+            "fingerprint": fingerprint,
+            "rows_committed": rows_committed,
+            "updated_at": dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+        }
+    )
+    return None
+
+
+def _mark_source_loaded(conn, source, fingerprint):
+    """Record that every row of this version of the source file is loaded, so later runs can skip it."""
+    conn.execute(
+        text('UPDATE "ETL_CHECKPOINT" SET completed = TRUE WHERE source_file = :source AND file_fingerprint = :fingerprint'),
+        {"source": source, "fingerprint": fingerprint}
+    )
+    return None
+
+
+def loaded_sources(engine, fingerprints) -> set:
+    """Return the source files (of {source: fingerprint}) that are fully loaded and unchanged since."""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table('ETL_CHECKPOINT') or 'completed' not in table_columns(conn, 'ETL_CHECKPOINT'):
+            return set()
+        rows = conn.execute(
+            text('SELECT source_file, file_fingerprint FROM "ETL_CHECKPOINT" WHERE completed = TRUE')
+        ).all()
+    return {source for source, fingerprint in rows if fingerprints.get(source) == fingerprint}
+
+
+def _insert_usage_batch(conn, batch) -> int:
+    """Insert one batch into USAGE, skipping rows whose key is already stored. Returns rows inserted."""
+    if not inspect(conn).has_table('USAGE'):
+        # First load: the batch creates the table, then the unique key guards every later insert
+        create_table_from_frame(conn, 'USAGE', batch)
+        _ensure_usage_indexes(conn)
+        return len(batch)
+    return insert_ignoring_duplicates(conn, 'USAGE', batch, USAGE_KEY)
+
+
+def _load_usage_rows(conn, usage_df, source=None, fingerprint=None) -> int:
+    """
+        Inserts the rows past the source's high-water mark and advances the mark in the same transaction.
+        The frame's index must be the row position in the raw file (as read by read_df/read_df_chunks).
+    """
+    start_row = _read_checkpoint(conn, source, fingerprint) if source else 0
+    pending = usage_df[usage_df.index >= start_row]
+    if pending.empty:
+        return 0
+    rows_inserted = _insert_usage_batch(conn, pending)
+    if source:
+        _save_checkpoint(conn, source, fingerprint, int(pending.index.max()) + 1)
+    return rows_inserted
+
+
+def insert_data_to_db_sqlalchemy(engine, cleaned_data, source=None, fingerprint=None, batch_size=LOAD_BATCH_SIZE) -> bool:
+    """Loads the cleaned usage rows in checkpointed batches. Returns False if the load failed."""
     print("Starting data loading into the database using SQLAlchemy..........................")
 
     if engine is None:
         print("Error: Engine is None")
-        return None
+        return False
 
     usage_df = cleaned_data.get('usage') if cleaned_data else None
     if usage_df is None:
         print("Error: No 'usage' dataframe found in cleaned_data")
-        return None
+        return False
 
     if usage_df.empty:
         print("No usage data to load; skipping")
-        return None
+        return True
 
-    # Drop duplicates prior to insert so we do not hit unique violations on reruns
-    usage_df = usage_df.drop_duplicates(subset=['msisdn', 'session_id', 'timestamp'])
+    # Drop duplicates prior to insert so a batch never conflicts with itself
+    usage_df = usage_df.drop_duplicates(subset=USAGE_KEY)
 
+    loaded = False
     try:
-        # Use engine's connection context manager for proper transaction handling
         with engine.begin() as conn:
-            # Insert data into USAGE table (append preserves existing data)
-            rows_inserted = usage_df.to_sql('USAGE', conn, if_exists='append', index=False)
-            print(f"Data inserted successfully: {rows_inserted} rows")
+            _prepare_usage_load(conn)
+            start_row = _read_checkpoint(conn, source, fingerprint) if source else 0
+        if start_row:
+            print(f"Resuming {source} after raw row {start_row} (earlier batches already committed)")
 
-            # Remove any existing duplicates in the table to allow unique index creation
-            conn.exec_driver_sql(
-                """
-                WITH ranked AS (
-                    SELECT ctid, ROW_NUMBER() OVER (
-                        PARTITION BY msisdn, session_id, "timestamp"
-                        ORDER BY ctid
-                    ) AS rn
-                    FROM "USAGE"
-                )
-                DELETE FROM "USAGE" u
-                USING ranked r
-                WHERE u.ctid = r.ctid AND r.rn > 1;
-                """
-            )
-            print("Removed duplicate rows in table before enforcing uniqueness")
+        # Each batch commits together with its checkpoint, so a failure only loses the batch in flight
+        pending = usage_df[usage_df.index >= start_row]
+        rows_inserted = 0
+        for offset in range(0, len(pending), batch_size):
+            with engine.begin() as conn:
+                rows_inserted += _load_usage_rows(conn, pending.iloc[offset:offset + batch_size], source, fingerprint)
+            print(f"Committed batch {offset // batch_size + 1}: {min(offset + batch_size, len(pending))}/{len(pending)} rows")
+        print(f"Data inserted successfully: {rows_inserted} new rows")
 
-            # Enforce uniqueness on the key columns to prevent duplicates on reruns
-            conn.exec_driver_sql(
-                'CREATE UNIQUE INDEX IF NOT EXISTS idx_usage_msisdn_session_ts '
-                'ON "USAGE" (msisdn, session_id, "timestamp")'
-            )
-            print("Unique index ensured on (msisdn, session_id, timestamp)")
-            print("Transaction committed automatically")
+        with engine.begin() as conn:
+            if source:
+                _mark_source_loaded(conn, source, fingerprint)
+            # Keep the per-day distribution sketches in step with the usage rows (unchanged if nothing was added)
+            day_range = usage_day_range(usage_df) if rows_inserted else None
+            if day_range:
+                _rebuild_usage_sketches(conn, *day_range)
+        loaded = True
 
     except Exception as e:
         print(f"Error inserting data: {e}")
@@ -62,9 +274,9 @@ def insert_data_to_db_sqlalchemy(engine, cleaned_data):
             print("SQLAlchemy engine disposed")
 
     print("Data loading complete..........................")
-    return None
+    return loaded
 
-def load_data_to_db(connection, cleaned_data):
+def load_data_to_db(connection, cleaned_data, source=None, fingerprint=None, batch_size=LOAD_BATCH_SIZE) -> bool:
     print("Starting data loading into the database..........................")
     
     # Import here to avoid circular imports
@@ -75,11 +287,58 @@ def load_data_to_db(connection, cleaned_data):
     
     if sqlalchemy_engine is None:
         print("Error: Could not create database engine")
-        return None
+        return False
     
     # Insert data into USAGE table using SQLAlchemy
     print("\nInserting data into table...")
-    insert_data_to_db_sqlalchemy(sqlalchemy_engine, cleaned_data)
+    loaded = insert_data_to_db_sqlalchemy(sqlalchemy_engine, cleaned_data, source, fingerprint, batch_size)
     
     print("Data loading complete..........................")
-    return None
\ No newline at end of file
+    return loaded
+
+
+def prepare_chunked_load(engine) -> None:
+    """Create the checkpoint table and ensure the usage key before any chunk is loaded (pipelined mode)."""
+    with engine.begin() as conn:
+        _prepare_usage_load(conn)
+    return None
+
+
+def load_usage_chunk(engine, usage_df, source=None, fingerprint=None) -> int:
+    """Load one cleaned usage chunk and its checkpoint in a single transaction (pipelined mode)."""
+    usage_df = usage_df.drop_duplicates(subset=USAGE_KEY)
+    with engine.begin() as conn:
+        return _load_usage_rows(conn, usage_df, source, fingerprint)
+
+
+def finish_chunked_load(engine, fingerprints, first_day=None, last_day=None) -> None:
+    """
+        Once all chunks are loaded (pipelined mode), mark the streamed files as fully loaded
+        and rebuild the sketches for [first_day, last_day], the days of the files that got new rows.
+    """
+    with engine.begin() as conn:
+        for source, fingerprint in fingerprints.items():
+            _mark_source_loaded(conn, source, fingerprint)
+        if first_day is not None:
+            _rebuild_usage_sketches(conn, first_day, last_day)
+    print("Chunked load finalized")
+    return None
+
+
+def rebuild_usage_sketches(engine, first_day=None, last_day=None):
+    """
+        Rebuilds the stored sketches from USAGE for [first_day, last_day] (default: every day in USAGE),
+        e.g. to backfill days loaded before the sketches existed. Returns the day range rebuilt, or None.
+    """
+    with engine.begin() as conn:
+        if first_day is None or last_day is None:
+            usage_day = date_expr(conn, '"timestamp"')
+            days = conn.exec_driver_sql(f'SELECT MIN({usage_day}), MAX({usage_day}) FROM "USAGE"').one()
+            if days[0] is None:
+                print("USAGE is empty; no sketches to rebuild")
+                return None
+            # SQLite hands dates back as ISO strings
+            first_day = first_day or dt.date.fromisoformat(str(days[0])[:10])
+            last_day = last_day or dt.date.fromisoformat(str(days[1])[:10])
+        _rebuild_usage_sketches(conn, first_day, last_day)
+    return first_day, last_day
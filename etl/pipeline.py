@@ -1,23 +1,40 @@
-from etl.extract import extract_all_data
-from etl.transform import transform_data
+from etl.extract import extract_all_data, iter_usage_chunks, usage_files, source_fingerprint
+from etl.transform import transform_data, transform_chunk
 import datetime as dt
-from utilities.config import names_of_raw_data
-from etl.load import load_data_to_db
+import queue
+import threading
+import time
+import traceback
+from utilities.config import names_of_raw_data, PIPELINE_CHUNKSIZE, PIPELINE_QUEUE_SIZE, LOAD_BATCH_SIZE
+from etl.load import (
+    load_data_to_db, loaded_sources, prepare_chunked_load, load_usage_chunk, finish_chunked_load, usage_day_range
+)
 
 
-def run_pipeline() -> None:
+def run_pipeline(batch_size: int = LOAD_BATCH_SIZE) -> bool:
+    """Runs extract -> transform -> load on the whole raw data. Returns False if any step failed."""
     print("Starting ETL pipeline..........................")
     start = dt.datetime.now(dt.timezone.utc) #pipeline start time in seconds
+    succeeded = False
     
     try:
-        # 1. Extract data
-        raw_data_frames = extract_all_data(names_of_raw_data)
+        sources = usage_files(names_of_raw_data)
+        source = sources[-1] if sources else None  # extract_all_data keeps the last usage file
+        fingerprint = source_fingerprint(source) if source else None
+        if source and source in _already_loaded({source: fingerprint}):
+            print(f"{source} is already fully loaded and unchanged since; nothing to do")
+            succeeded = True
+        else:
+            # 1. Extract data
+            raw_data_frames = extract_all_data(names_of_raw_data)
 
-        # 2. Transform data
-        output = transform_data(raw_data_frames.copy())
+            # 2. Transform data
+            output = transform_data(raw_data_frames.copy())
 
-        # 3. Load data
-        load_data_to_db(None, output['cleaned_data'])
+            # 3. Load data (checkpointed against the usage file so an interrupted load resumes)
+            succeeded = load_data_to_db(
+                None, output['cleaned_data'], source=source, fingerprint=fingerprint, batch_size=batch_size
+            )
     except Exception as e:
         print(f"Error in pipeline: {e}")
         import traceback
@@ -28,4 +45,194 @@ def run_pipeline() -> None:
     end = dt.datetime.now(dt.timezone.utc) #pipeline end time in seconds
     duration = (end - start).total_seconds()    #duration in seconds taken to run the pipeline
     print(f"[pipeline] Finished ETL at {end.isoformat()}Z (duration: {duration:.1f}s)")
-    return None
\ No newline at end of file
+    return succeeded
+
+def _already_loaded(fingerprints) -> set:
+    """Source files whose checkpoint says they are fully loaded, checked before anything is read."""
+    # Import here to avoid circular imports
+    from utilities.DB_connection import make_sqlalchemy_db_connection
+    engine = make_sqlalchemy_db_connection()
+    if engine is None:
+        return set()  # the load step reports the connection error
+    try:
+        return loaded_sources(engine, fingerprints)
+    finally:
+        engine.dispose()
+
+_END = object()  # marks the end of a stage's stream
+
+
+def _put(q, item, stop) -> bool:
+    # Blocks while the queue is full (back-pressure) but gives up once another stage has failed
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def _run_stage(name, source, work, outbox, stats, stop) -> None:
+    """
+        Runs one pipeline stage (meant for its own thread).
+        `source` is either an iterator (the extract stage, where producing items is the work)
+        or the queue filled by the previous stage. Each item goes through `work` and the result
+        is put on `outbox`. Time is split into busy, waiting for input and blocked on output.
+    """
+    stage = {'items': 0, 'busy': 0.0, 'wait_in': 0.0, 'wait_out': 0.0, 'wall': 0.0, 'error': None}
+    stats[name] = stage
+    reads_queue = isinstance(source, queue.Queue)
+    start = time.perf_counter()
+    try:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            item = _get(source, stop) if reads_queue else next(source, _END)
+            t1 = time.perf_counter()
+            stage['wait_in' if reads_queue else 'busy'] += t1 - t0
+            if item is _END:
+                break
+
+            result = work(item)
+            t2 = time.perf_counter()
+            stage['busy'] += t2 - t1
+
+            if outbox is not None and not _put(outbox, result, stop):
+                break
+            stage['wait_out'] += time.perf_counter() - t2
+            stage['items'] += 1
+    except Exception as e:
+        stage['error'] = e
+        print(f"Error in {name} stage: {e}")
+        traceback.print_exc()
+        stop.set()  # unblock and stop the other stages
+    finally:
+        if outbox is not None:
+            _put(outbox, _END, stop)
+        stage['wall'] = time.perf_counter() - start
+
+
+def _report_stage_utilization(stats) -> None:
+    print("[pipeline] Stage utilization (busy time / stage wall time):")
+    for name, stage in stats.items():
+        utilization = 100 * stage['busy'] / stage['wall'] if stage['wall'] else 0.0
+        print(
+            f"[pipeline]   {name:<8} {stage['items']:>5} chunks | busy {stage['busy']:7.2f}s ({utilization:5.1f}%)"
+            f" | waiting for input {stage['wait_in']:7.2f}s | blocked on output {stage['wait_out']:7.2f}s"
+        )
+    if any(stage['error'] for stage in stats.values()):
+        return None  # utilization of a run that stopped early says nothing about the bottleneck
+    bottleneck = max(stats, key=lambda name: stats[name]['busy'])
+    print(f"[pipeline] Throughput is limited by the '{bottleneck}' stage")
+    return None
+
+
+def run_pipelined_pipeline(chunksize: int = PIPELINE_CHUNKSIZE, queue_size: int = PIPELINE_QUEUE_SIZE) -> bool:
+    """
+        Runs extract -> clean -> load as three threads connected by bounded queues,
+        so parsing the next chunk overlaps with inserting the previous one.
+        Only the usage files are streamed, since they are the only source that is loaded.
+        Missing throughput values are filled with the median of their own chunk;
+        duplicate session_ids are dropped across the whole file, as in the batch run.
+        Each chunk commits with its checkpoint, so a rerun skips the chunks already loaded
+        (and files already fully loaded are not read at all).
+        Returns False if any stage failed.
+    """
+    print("Starting pipelined ETL pipeline..........................")
+    start = dt.datetime.now(dt.timezone.utc)
+
+    # Import here to avoid circular imports
+    from utilities.DB_connection import make_sqlalchemy_db_connection
+    engine = make_sqlalchemy_db_connection()
+    if engine is None:
+        print("Error: Could not create database engine")
+        return False
+
+    try:
+        prepare_chunked_load(engine)
+        fingerprints = {path: source_fingerprint(path) for path in usage_files(names_of_raw_data)}
+        for path in loaded_sources(engine, fingerprints):
+            print(f"{path} is already fully loaded and unchanged since; skipping")
+            del fingerprints[path]
+    except Exception as e:
+        print(f"Error in pipeline: {e}")
+        traceback.print_exc()
+        engine.dispose()
+        return False
+    if not fingerprints:
+        engine.dispose()
+        print("Nothing to load; ETL pipeline complete..........................")
+        return True
+
+    extracted = queue.Queue(maxsize=queue_size)
+    cleaned = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    stats = {}
+    succeeded = False
+    file_days = {}  # (first, last) day per file, for the sketch rebuild
+    new_rows = {}  # rows inserted per file; files without any keep their sketches
+    seen_sessions = {}  # session_ids kept so far, per file
+
+    def clean(item):
+        path, chunk = item
+        return path, transform_chunk(chunk, seen_sessions.setdefault(path, set()))
+
+    def load(item):
+        path, usage_chunk = item
+        day_range = usage_day_range(usage_chunk)
+        if day_range:
+            first, last = file_days.get(path, day_range)
+            file_days[path] = (min(first, day_range[0]), max(last, day_range[1]))
+        rows_inserted = load_usage_chunk(engine, usage_chunk, path, fingerprints[path]) if not usage_chunk.empty else 0
+        new_rows[path] = new_rows.get(path, 0) + rows_inserted
+        return rows_inserted
+
+    stages = [
+        ('extract', iter_usage_chunks(list(fingerprints), chunksize), lambda item: item, extracted),
+        ('clean', extracted, clean, cleaned),
+        ('load', cleaned, load, None),
+    ]
+    threads = [
+        threading.Thread(target=_run_stage, args=(name, source, work, outbox, stats, stop), name=f"etl-{name}")
+        for name, source, work, outbox in stages
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if any(stage['error'] for stage in stats.values()):
+            print("Pipelined run stopped early; chunks committed so far are kept")
+        else:
+            changed_days = [days for path, days in file_days.items() if new_rows.get(path)]
+            if changed_days:
+                finish_chunked_load(
+                    engine, fingerprints, min(first for first, _ in changed_days), max(last for _, last in changed_days)
+                )
+            else:
+                finish_chunked_load(engine, fingerprints)
+            succeeded = True
+    except Exception as e:
+        print(f"Error in pipeline: {e}")
+        traceback.print_exc()
+    finally:
+        engine.dispose()
+        print("SQLAlchemy engine disposed")
+
+    _report_stage_utilization(stats)
+    print("ETL pipeline complete..........................")
+
+    end = dt.datetime.now(dt.timezone.utc)
+    duration = (end - start).total_seconds()
+    print(f"[pipeline] Finished pipelined ETL at {end.isoformat()}Z (duration: {duration:.1f}s)")
+    return succeeded
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from utilities.config import SKETCH_BIN_WIDTHS
+
+SKETCH_COLUMNS = [
+    'usage_date', 'metric', 'bin_index', 'bin_width',
+    'value_count', 'value_sum', 'min_value', 'max_value'
+]
+
+
+def build_daily_sketches(df: pd.DataFrame) -> pd.DataFrame:
+    """
+        Builds fixed-width histogram sketches per day for each metric in SKETCH_BIN_WIDTHS.
+        Every row is one non-empty bin holding its count, sum, min and max,
+        so sketches for different days (or chunks) merge by simple addition.
+        The stored sketches are built the same way in SQL from USAGE (see etl/load.py).
+    """
+    if df.empty or 'timestamp' not in df.columns:
+        return pd.DataFrame(columns=SKETCH_COLUMNS)
+
+    usage_date = pd.to_datetime(df['timestamp'], errors='coerce').dt.date
+    sketches = []
+    for metric, bin_width in SKETCH_BIN_WIDTHS.items():
+        if metric not in df.columns:
+            continue
+        values = pd.DataFrame({'usage_date': usage_date, 'value': pd.to_numeric(df[metric], errors='coerce')})
+        values = values.dropna()
+        if values.empty:
+            continue
+        values['bin_index'] = np.floor(values['value'] / bin_width).astype('int64')
+        sketch = (
+            values.groupby(['usage_date', 'bin_index'])['value']
+            .agg(value_count='count', value_sum='sum', min_value='min', max_value='max')
+            .reset_index()
+        )
+        sketch['metric'] = metric
+        sketch['bin_width'] = bin_width
+        sketches.append(sketch)
+
+    if not sketches:
+        return pd.DataFrame(columns=SKETCH_COLUMNS)
+    return pd.concat(sketches, ignore_index=True)[SKETCH_COLUMNS]
+
+
+def merge_sketches(sketches: pd.DataFrame, by_date: bool = True) -> pd.DataFrame:
+    """Merges sketch rows that describe the same bin (optionally keeping days apart)."""
+    if sketches.empty:
+        return sketches
+    keys = ['usage_date', 'metric', 'bin_index', 'bin_width'] if by_date else ['metric', 'bin_index', 'bin_width']
+    return (
+        sketches.groupby(keys)
+        .agg(value_count=('value_count', 'sum'), value_sum=('value_sum', 'sum'),
+             min_value=('min_value', 'min'), max_value=('max_value', 'max'))
+        .reset_index()
+    )
+
+
+def _metric_bins(sketch: pd.DataFrame, metric: str) -> pd.DataFrame:
+    if sketch.empty:
+        return sketch
+    bins = sketch[sketch['metric'] == metric]
+    if 'usage_date' in bins.columns:
+        bins = merge_sketches(bins, by_date=False)
+    return bins.sort_values('bin_index').reset_index(drop=True)
+
+
+def sketch_summary(sketch: pd.DataFrame, metric: str) -> dict:
+    """Returns the exact count, mean, min and max of a metric from its sketch."""
+    bins = _metric_bins(sketch, metric)
+    if bins.empty or bins['value_count'].sum() == 0:
+        return {'count': 0, 'mean': np.nan, 'min': np.nan, 'max': np.nan}
+    count = bins['value_count'].sum()
+    return {
+        'count': int(count),
+        'mean': bins['value_sum'].sum() / count,
+        'min': bins['min_value'].min(),
+        'max': bins['max_value'].max()
+    }
+
+
+def sketch_quantiles(sketch: pd.DataFrame, metric: str, quantiles) -> list:
+    """
+        Estimates quantiles of a metric from its sketch.
+        The value is interpolated inside the bin holding the target rank,
+        so the error is bounded by that metric's bin width.
+    """
+    bins = _metric_bins(sketch, metric)
+    if bins.empty:
+        return [np.nan for _ in quantiles]
+
+    counts = bins['value_count'].to_numpy(dtype=float)
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1]
+    # Clamp each bin to the values actually seen in it for a tighter estimate
+    lower = np.maximum(bins['bin_index'] * bins['bin_width'], bins['min_value']).to_numpy(dtype=float)
+    upper = np.minimum((bins['bin_index'] + 1) * bins['bin_width'], bins['max_value']).to_numpy(dtype=float)
+
+    results = []
+    for q in quantiles:
+        rank = q * total
+        idx = min(int(np.searchsorted(cumulative, rank, side='left')), len(counts) - 1)
+        before = cumulative[idx] - counts[idx]
+        fraction = (rank - before) / counts[idx] if counts[idx] else 0.0
+        results.append(lower[idx] + (upper[idx] - lower[idx]) * min(max(fraction, 0.0), 1.0))
+    return results
+
+
+def sketch_histogram(sketch: pd.DataFrame, metric: str, nbins: int = 30, scale: float = 1.0) -> pd.DataFrame:
+    """
+        Re-bins a metric's sketch into `nbins` equal-width bars between its min and max.
+        `scale` converts units for display (e.g. 1/1000 for ms -> seconds).
+    """
+    bins = _metric_bins(sketch, metric)
+    if bins.empty:
+        return pd.DataFrame(columns=['bin_start', 'bin_end', 'frequency'])
+
+    lo = bins['min_value'].min() * scale
+    hi = bins['max_value'].max() * scale
+    if hi <= lo:
+        hi = lo + 1
+    edges = np.linspace(lo, hi, nbins + 1)
+    centers = (bins['value_sum'] / bins['value_count']) * scale  # place each fine bin at its mean
+    target = np.clip(np.searchsorted(edges, centers, side='right') - 1, 0, nbins - 1)
+    frequency = np.bincount(target, weights=bins['value_count'], minlength=nbins)
+    return pd.DataFrame({'bin_start': edges[:-1], 'bin_end': edges[1:], 'frequency': frequency})
@@ -1,6 +1,7 @@
 import pandas as pd
 
-def _clean_dfs(dfs):
+def _clean_dfs(dfs, seen_sessions=None):
+    # seen_sessions: session_ids kept from earlier chunks of the same file (pipelined mode), updated in place
     cleaned = {}
     for key, df in dfs.items():
         if df.empty:
@@ -18,6 +19,13 @@ def _clean_dfs(dfs):
             
         if 'session_id' in df.columns:    
             df = df.drop_duplicates(subset=['session_id'], keep='first') 
+            if seen_sessions is not None:
+                # Plain set lookups keep this O(chunk): isin() would rebuild a hash table of every id seen so far.
+                # A missing session_id is keyed as None so, like drop_duplicates, only the file's first one is kept.
+                session_keys = [None if pd.isna(session) else session for session in df['session_id']]
+                is_new = [session not in seen_sessions for session in session_keys]
+                df = df[is_new]
+                seen_sessions.update(session for session, new in zip(session_keys, is_new) if new)
         
         if 'download_mb' in df.columns and 'upload_mb' in df.columns:
             df['total_usage_mb'] = df['download_mb'].fillna(0) + df['upload_mb'].fillna(0)
@@ -76,4 +84,17 @@ def transform_data(dfs):
     return {
         'cleaned_data': cleaned_dfs,
         'daily_usage_aggregation': daily_usage_agg
-    }
\ No newline at end of file
+    }
+
+
+def transform_chunk(df, seen_sessions=None):
+    """
+        Cleans one chunk of usage rows (pipelined mode).
+        Pass the same `seen_sessions` set for every chunk of a file so a session_id
+        repeated across chunks is dropped like it is when the whole file is cleaned at once.
+    """
+    cleaned = _clean_dfs({'usage': df}, seen_sessions)['usage']
+    if not cleaned.empty and 'timestamp' in cleaned.columns:
+        # Same columns the batch path leaves on the usage frame after _aggregate_daily_usage
+        cleaned['date'] = cleaned['timestamp'].dt.date
+    return cleaned
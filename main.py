@@ -1,5 +1,193 @@
-from etl.pipeline import run_pipeline
+import argparse
+import os
+import re
+import sys
+from utilities.config import (
+    RAW_DATA_DIR, names_of_raw_data, STARTUP_IMPORT_BUDGET_MS, HEAVY_MODULES,
+    PIPELINE_CHUNKSIZE, PIPELINE_QUEUE_SIZE, LOAD_BATCH_SIZE
+)
 
-if __name__ == "__main__":
-    run_pipeline()
+# Keep this module's top-level imports to the standard library and utilities.config:
+# pandas, SQLAlchemy, dotenv and the DB settings are only loaded by commands that need them.
+
+
+def _present_raw_files() -> list:
+    """Return the expected raw files that currently exist in the raw data directory."""
+    return [name for name in names_of_raw_data if (RAW_DATA_DIR / name).is_file()]
+
+
+def _iso_date(value: str):
+    import datetime as dt
+    try:
+        return dt.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a YYYY-MM-DD date: {value}")
+
+
+def _masked_database_url() -> str:
+    """Resolve the DB URL without connecting, hiding the password."""
+    from utilities.DB_connection import get_database_url
+    try:
+        return re.sub(r'://([^:/@]+):[^@]*@', r'://\1:***@', get_database_url())
+    except ValueError as e:
+        return f"not configured ({e})"
+    except ImportError as e:
+        # e.g. python-dotenv missing: the light commands still report what they can
+        return f"unavailable ({e}; install requirements.txt)"
+
+
+def command_run(args) -> int:
+    present = _present_raw_files()
+    if not present:
+        print(f"No raw files found in {RAW_DATA_DIR}; nothing to do.")
+        return 0
+
+    if args.pipelined:
+        from etl.pipeline import run_pipelined_pipeline
+        succeeded = run_pipelined_pipeline(chunksize=args.chunksize, queue_size=args.queue_size)
+    else:
+        from etl.pipeline import run_pipeline
+        succeeded = run_pipeline(batch_size=args.batch_size)
+    return 0 if succeeded else 1
+
+
+def command_dry_run(args) -> int:
+    present = _present_raw_files()
+    print(f"Raw data directory: {RAW_DATA_DIR}")
+    for name in names_of_raw_data:
+        path = RAW_DATA_DIR / name
+        print(f"  [{'x' if name in present else ' '}] {name}" + (f" ({path.stat().st_size:,} bytes)" if name in present else ""))
+    print(f"Database: {_masked_database_url()}")
+    if not present:
+        print("Dry run: nothing to do, `run` would exit without loading.")
+    else:
+        print(f"Dry run: `run` would extract {len(present)} file(s), transform and load the usage data.")
+    return 0
+
+
+def command_status(args) -> int:
+    present = _present_raw_files()
+    print(f"Raw files present: {len(present)}/{len(names_of_raw_data)} in {RAW_DATA_DIR}")
+    print(f"Database: {_masked_database_url()}")
+    if args.db:
+        # Only touch the database (and import SQLAlchemy) when asked to
+        from utilities.DB_connection import make_sqlalchemy_db_connection
+        engine = make_sqlalchemy_db_connection()
+        if engine is None:
+            return 1
+        try:
+            with engine.connect() as conn:
+                rows = conn.exec_driver_sql('SELECT COUNT(*), MAX("timestamp") FROM "USAGE"').one()
+                print(f"USAGE rows: {rows[0]:,} (latest timestamp: {rows[1]})")
+                checkpoints = conn.exec_driver_sql(
+                    'SELECT source_file, rows_committed, updated_at FROM "ETL_CHECKPOINT" ORDER BY source_file'
+                ).all() if engine.dialect.has_table(conn, 'ETL_CHECKPOINT') else []
+            for source_file, rows_committed, updated_at in checkpoints:
+                print(f"Checkpoint {source_file}: {rows_committed:,} raw rows committed (at {updated_at})")
+        except Exception as e:
+            print(f"Error querying USAGE table: {e}")
+            return 1
+        finally:
+            engine.dispose()
+    return 0
+
+
+def command_backfill_sketches(args) -> int:
+    from etl.load import rebuild_usage_sketches
+    from utilities.DB_connection import make_sqlalchemy_db_connection
+    engine = make_sqlalchemy_db_connection()
+    if engine is None:
+        return 1
+    try:
+        rebuild_usage_sketches(engine, args.start, args.end)
+    except Exception as e:
+        print(f"Error rebuilding sketches: {e}")
+        return 1
+    finally:
+        engine.dispose()
+    return 0
 
+
+def _import_time_ms(command: list) -> tuple:
+    """Run `python -X importtime main.py <command>` and return (total ms, imported top-level packages)."""
+    import subprocess
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), *command],
+        capture_output=True, text=True, check=False
+    )
+    total_us = 0
+    packages = set()
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+\s+\|\s+(\d+)\s+\|( *)(\S+)', line)
+        if not match:
+            continue
+        packages.add(match.group(3).split('.')[0])
+        if len(match.group(2)) == 1:  # top-level import (nested ones are indented further)
+            total_us += int(match.group(1))
+    return total_us / 1000, packages
+
+
+def command_check_startup(args) -> int:
+    budget = args.budget_ms
+    failed = False
+    for command in (["status"], ["dry-run"]):
+        total_ms, packages = _import_time_ms(command)
+        heavy = sorted(set(HEAVY_MODULES) & packages)
+        ok = total_ms <= budget and not heavy
+        failed = failed or not ok
+        print(f"{'OK  ' if ok else 'FAIL'} main.py {' '.join(command)}: imports took {total_ms:.1f} ms (budget {budget} ms)"
+              + (f", heavy modules imported: {', '.join(heavy)}" if heavy else ""))
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="main.py", description="Skylink ETL command line.")
+    parser.add_argument("--backend", choices=["postgres", "duckdb", "sqlite"],
+                        help="Storage backend (overrides the db_backend env var; default postgres).")
+    parser.add_argument("--db-path", help="Database file for the duckdb/sqlite backends (default data/skylink.<backend>).")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="Extract, transform and load the raw files (default).")
+    run_parser.add_argument("--pipelined", action="store_true",
+                            help="Overlap extract, clean and load in threads connected by bounded queues.")
+    run_parser.add_argument("--chunksize", type=int, default=PIPELINE_CHUNKSIZE, help="Rows per chunk (pipelined mode).")
+    run_parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE,
+                            help="Chunks buffered between stages (pipelined mode).")
+    run_parser.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE,
+                            help="Rows committed per transaction (each commit is checkpointed).")
+    run_parser.set_defaults(func=command_run)
+
+    dry_run_parser = subparsers.add_parser("dry-run", help="Show what `run` would do without loading anything.")
+    dry_run_parser.set_defaults(func=command_dry_run)
+
+    status_parser = subparsers.add_parser("status", help="Show raw files and database configuration.")
+    status_parser.add_argument("--db", action="store_true", help="Also connect and report USAGE row counts.")
+    status_parser.set_defaults(func=command_status)
+
+    backfill_parser = subparsers.add_parser("backfill-sketches",
+                                            help="Rebuild the dashboard's distribution sketches from USAGE.")
+    backfill_parser.add_argument("--start", type=_iso_date, help="First day to rebuild (default: earliest in USAGE).")
+    backfill_parser.add_argument("--end", type=_iso_date, help="Last day to rebuild (default: latest in USAGE).")
+    backfill_parser.set_defaults(func=command_backfill_sketches)
+
+    check_parser = subparsers.add_parser("check-startup", help="Check CLI import time against the startup budget.")
+    check_parser.add_argument("--budget-ms", type=float, default=STARTUP_IMPORT_BUDGET_MS)
+    check_parser.set_defaults(func=command_check_startup)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        # `python main.py` keeps running the pipeline as before
+        args = build_parser().parse_args([*(sys.argv[1:] if argv is None else argv), "run"])
+    # Passed through the environment so the pipeline and DB_connection pick them up as usual
+    if args.backend:
+        os.environ["db_backend"] = args.backend
+    if args.db_path:
+        os.environ["db_path"] = args.db_path
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+import sys
+import main
+
+
+def test_empty_argv_runs_the_pipeline_without_reading_sys_argv(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['pytest', '-q', '--not-a-main-option'])
+    monkeypatch.setattr(main, '_present_raw_files', lambda: [])
+    assert main.main([]) == 0
+    assert 'nothing to do' in capsys.readouterr().out
+
+
+def test_light_commands_report_missing_dotenv(monkeypatch, capsys):
+    monkeypatch.setitem(sys.modules, 'dotenv', None)  # makes `import dotenv` raise ImportError
+    assert main.main(['status']) == 0
+    assert main.main(['dry-run']) == 0
+    out = capsys.readouterr().out
+    assert out.count('Database: unavailable') == 2
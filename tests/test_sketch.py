@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from etl.sketch import build_daily_sketches, merge_sketches, sketch_quantiles, sketch_summary
+from utilities.config import SKETCH_BIN_WIDTHS
+
+
+@pytest.fixture
+def usage():
+    rng = np.random.default_rng(7)
+    n = 5_000
+    return pd.DataFrame({
+        'timestamp': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 3 * 86_400, n), unit='s'),
+        'avg_throughput': rng.lognormal(2.5, 0.6, n),
+        'latency_ms': rng.gamma(2.0, 30.0, n),
+        'duration_ms': rng.exponential(20_000.0, n),
+    })
+
+
+@pytest.mark.parametrize('metric', list(SKETCH_BIN_WIDTHS))
+def test_quantiles_within_one_bin_width(usage, metric):
+    sketch = build_daily_sketches(usage)
+    quantiles = [0.01, 0.25, 0.5, 0.75, 0.99]
+    estimated = sketch_quantiles(sketch, metric, quantiles)
+    expected = np.quantile(usage[metric], quantiles)
+    assert np.all(np.abs(np.array(estimated) - expected) <= SKETCH_BIN_WIDTHS[metric])
+
+
+@pytest.mark.parametrize('metric', list(SKETCH_BIN_WIDTHS))
+def test_summary_is_exact(usage, metric):
+    summary = sketch_summary(build_daily_sketches(usage), metric)
+    assert summary['count'] == len(usage)
+    assert summary['min'] == usage[metric].min()
+    assert summary['max'] == usage[metric].max()
+    assert summary['mean'] == pytest.approx(usage[metric].mean())
+
+
+def test_sketches_of_parts_merge_to_the_whole(usage):
+    parts = [build_daily_sketches(usage.iloc[start:start + 1_250]) for start in range(0, len(usage), 1_250)]
+    merged = merge_sketches(pd.concat(parts, ignore_index=True))
+    whole = build_daily_sketches(usage)
+    for metric in SKETCH_BIN_WIDTHS:
+        assert sketch_summary(merged, metric) == pytest.approx(sketch_summary(whole, metric))
+        assert sketch_quantiles(merged, metric, [0.5]) == pytest.approx(sketch_quantiles(whole, metric, [0.5]))
+
+
+def test_missing_values_are_not_counted(usage):
+    usage.loc[usage.index[:100], 'latency_ms'] = np.nan
+    assert sketch_summary(build_daily_sketches(usage), 'latency_ms')['count'] == len(usage) - 100
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'duckdb'])
+def test_sql_rebuild_matches_pandas_sketches(usage, backend, tmp_path):
+    # The stored sketches are built in SQL (etl.load); build_daily_sketches is the reference
+    if backend == 'duckdb':
+        pytest.importorskip('duckdb_engine')
+    from sqlalchemy import create_engine
+    from etl.load import rebuild_usage_sketches
+
+    # Negative values, and values on bin edges, exercise the floor() spelled out for SQLite
+    usage.loc[usage.index[:50], 'latency_ms'] = -usage['latency_ms'].iloc[:50]
+    usage.loc[usage.index[50:60], 'avg_throughput'] = [-1.5, -1.0, -0.5, -0.25, 0.0, 0.5, 1.0, 1.25, 2.0, -2.0]
+    usage.loc[usage.index[60:70], 'latency_ms'] = np.nan
+
+    engine = create_engine(f"{backend}:///{tmp_path / f'usage.{backend}'}")
+    try:
+        with engine.begin() as conn:
+            usage.to_sql('USAGE', conn, index=False)
+        rebuild_usage_sketches(engine)
+        with engine.connect() as conn:
+            stored = pd.read_sql_query('SELECT * FROM "USAGE_SKETCH"', conn)
+    finally:
+        engine.dispose()
+
+    keys = ['usage_date', 'metric', 'bin_index']
+    stored['usage_date'] = pd.to_datetime(stored['usage_date']).dt.date
+    stored = stored.sort_values(keys).reset_index(drop=True)
+    expected = build_daily_sketches(usage).sort_values(keys).reset_index(drop=True)
+
+    assert stored[keys + ['value_count']].astype({'bin_index': 'int64', 'value_count': 'int64'}).equals(
+        expected[keys + ['value_count']].astype({'bin_index': 'int64', 'value_count': 'int64'})
+    )
+    for column in ['bin_width', 'value_sum', 'min_value', 'max_value']:
+        np.testing.assert_allclose(stored[column].astype(float), expected[column].astype(float), rtol=1e-9)
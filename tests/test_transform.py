@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from etl.transform import _clean_dfs, transform_chunk
+
+
+def _usage_rows():
+    # Session ids repeat across chunk boundaries, and several chunks have a missing session_id
+    return pd.DataFrame({
+        'msisdn': np.arange(12) + 2340000000,
+        'session_id': [1, 2, np.nan, 3, 1, np.nan, 4, 2, 5, np.nan, 3, 6],
+        'timestamp': pd.date_range('2025-01-01', periods=12, freq='h').astype(str),
+        'download_mb': np.linspace(1.0, 12.0, 12),
+        'upload_mb': np.linspace(0.5, 6.0, 12),
+        'avg_throughput': [10.0, np.nan, 12.0, 13.0, 14.0, 15.0, np.nan, 17.0, 18.0, 19.0, 20.0, 21.0],
+        'latency_ms': np.linspace(20.0, 80.0, 12),
+        'duration_ms': [1000.0, 2000.0, -1.0, 4000.0, 5000.0, 6000.0, 7000.0, 8000.0, 9000.0, 10000.0, 11000.0, 12000.0],
+        'app_category': ['video'] * 12,
+    })
+
+
+def test_chunked_clean_keeps_the_same_sessions_as_the_batch_clean():
+    usage = _usage_rows()
+    batch = _clean_dfs({'usage': usage})['usage']
+
+    seen_sessions = set()
+    chunks = [transform_chunk(usage.iloc[start:start + 3], seen_sessions) for start in range(0, len(usage), 3)]
+    chunked = pd.concat(chunks)
+
+    assert chunked.index.tolist() == batch.index.tolist()
+    pd.testing.assert_series_equal(chunked['session_id'], batch['session_id'])
+    assert chunked['session_id'].isna().sum() <= 1
@@ -1,36 +1,62 @@
-from sqlalchemy import create_engine
-from urllib.parse import quote_plus
-from dotenv import load_dotenv
 import os
+from utilities.storage import LOCAL_BACKENDS, ensure_local_database_dir, local_database_url
 
-load_dotenv()  # Load environment variables from .env file
+# The .env file, SQLAlchemy and the URL are only resolved when a connection is needed,
+# so importing this module (e.g. for `python main.py status`) stays cheap.
 
-# Try DATABASE_URL first (for cloud deployment like Render)
-database_url = os.getenv("db_connection_string")
+def get_database_url() -> str:
+    """Resolve the database URL from the environment (.env is loaded on first use)."""
+    from dotenv import load_dotenv
+    from urllib.parse import quote_plus
 
-if not database_url:
-    # Fall back to individual environment variables for local development
-    host = os.getenv("host")
-    database = os.getenv("database")
-    user = os.getenv("user")
-    password = os.getenv("password")
-    port = os.getenv("port")
+    load_dotenv()  # Load environment variables from .env file
 
-    # Validate that all required env vars are loaded
-    if not all([host, database, user, password, port]):
-        raise ValueError("Missing required environment variables in .env file: host, database, user, password, port")
+    # Embedded DuckDB/SQLite file for offline runs and CI (no server needed)
+    backend = os.getenv("db_backend", "postgres").lower()
+    if backend in LOCAL_BACKENDS:
+        return local_database_url(backend, os.getenv("db_path"))
+    if backend not in ("postgres", "postgresql"):
+        raise ValueError(f"Unsupported db_backend '{backend}'. Choose postgres, {', '.join(LOCAL_BACKENDS)}")
 
-    # Encode the password to handle special characters like @
-    encoded_password = quote_plus(password)
-    database_url = f'postgresql+psycopg2://{user}:{encoded_password}@{host}:{port}/{database}'
+    # Try DATABASE_URL first (for cloud deployment like Render)
+    database_url = os.getenv("db_connection_string")
+
+    if not database_url:
+        # Fall back to individual environment variables for local development
+        host = os.getenv("host")
+        database = os.getenv("database")
+        user = os.getenv("user")
+        password = os.getenv("password")
+        port = os.getenv("port")
+
+        # Validate that all required env vars are loaded
+        if not all([host, database, user, password, port]):
+            raise ValueError("Missing required environment variables in .env file: host, database, user, password, port")
+
+        # Encode the password to handle special characters like @
+        encoded_password = quote_plus(password)
+        database_url = f'postgresql+psycopg2://{user}:{encoded_password}@{host}:{port}/{database}'
+
+    return database_url
 
 ### connection using SQLAlchemy (if needed)
-def make_sqlalchemy_db_connection():
-    """Create a SQLAlchemy engine for the PostgreSQL database."""
+def make_sqlalchemy_db_connection(read_only: bool = False):
+    """
+        Create a SQLAlchemy engine for the configured database (PostgreSQL, DuckDB or SQLite).
+        With read_only=True (the dashboard), a DuckDB file is opened read-only and without pooling:
+        DuckDB locks the file per process, so a pooled connection would keep `main.py run` from writing.
+    """
     engine = None
     try:
-        engine = create_engine(database_url)
+        from sqlalchemy import create_engine
+        database_url = get_database_url()
+        ensure_local_database_dir(database_url)
+        if read_only and database_url.startswith("duckdb:"):
+            from sqlalchemy.pool import NullPool
+            engine = create_engine(database_url, poolclass=NullPool, connect_args={"read_only": True})
+        else:
+            engine = create_engine(database_url)
         print("SQLAlchemy engine created successfully")
     except Exception as e:
         print(f"Error: {e}")
-    return engine
\ No newline at end of file
+    return engine
@@ -10,4 +10,25 @@ names_of_raw_data = [
     "partner_roaming.xlsx",
     "raw_usage_2025_01.csv",
     "sessions.json"
-]
\ No newline at end of file
+]
+
+# Bin width per metric for the daily distribution sketches (see etl/sketch.py).
+# Quantiles read back from a sketch are off by at most one bin width.
+SKETCH_BIN_WIDTHS = {
+    "avg_throughput": 0.5,   # Mbps
+    "latency_ms": 2.0,       # ms
+    "duration_ms": 1000.0,   # ms
+}
+
+# Import-time budget for the light CLI commands (`python main.py check-startup`).
+# `status`, `dry-run` and a `run` with nothing to do must not import pandas/SQLAlchemy.
+STARTUP_IMPORT_BUDGET_MS = 100  # the full pipeline import chain takes ~700 ms
+HEAVY_MODULES = ["pandas", "numpy", "sqlalchemy", "pyarrow", "streamlit"]
+
+# Pipelined mode (`python main.py run --pipelined`): rows per chunk and chunks buffered between stages
+PIPELINE_CHUNKSIZE = 50_000
+PIPELINE_QUEUE_SIZE = 4
+
+# Rows committed per transaction by the load step; each commit also advances the
+# per-file high-water mark in the ETL_CHECKPOINT table so an interrupted load resumes there
+LOAD_BATCH_SIZE = 50_000
@@ -0,0 +1,61 @@
+import datetime as dt
+import pandas as pd
+from sqlalchemy import text
+
+EXPORT_COLUMNS = [
+    'msisdn', 'session_id', 'timestamp', 'download_mb', 'upload_mb',
+    'total_usage_mb', 'avg_throughput', 'latency_ms', 'duration_ms', 'app_category'
+]
+
+
+def usage_range_params(start_date, end_date=None, min_usage=0.0) -> dict:
+    """
+        Builds query params for a date range as a half-open timestamp interval,
+        so the (timestamp, ...) index can be used instead of casting every row to a date.
+    """
+    end_date = end_date or start_date
+    end_exclusive = dt.date.fromisoformat(str(end_date)) + dt.timedelta(days=1)
+    return {
+        "start_ts": str(start_date),
+        "end_ts": end_exclusive.isoformat(),
+        "min_usage": float(min_usage or 0.0)
+    }
+
+
+def write_usage_export(engine, out, start_date, end_date=None, min_usage=0.0, file_format='csv', chunksize=50_000) -> int:
+    """
+        Streams USAGE rows for the range from the database into the binary file object `out`,
+        one chunk at a time, as CSV or Parquet. Returns the number of rows written.
+    """
+    if file_format not in ('csv', 'parquet'):
+        raise ValueError("Unsupported export format. Please choose 'csv' or 'parquet'.")
+
+    query = """
+        SELECT * FROM "USAGE"
+        WHERE "timestamp" >= :start_ts AND "timestamp" < :end_ts
+          AND total_usage_mb >= :min_usage
+        ORDER BY "timestamp" DESC;
+    """
+    params = usage_range_params(start_date, end_date, min_usage)
+
+    rows_written = 0
+    parquet_writer = None
+    # stream_results keeps a server-side cursor open so only one chunk is in memory at a time
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql_query(text(query), conn, params=params, chunksize=chunksize, parse_dates=["timestamp"]):
+            chunk = chunk[[c for c in EXPORT_COLUMNS if c in chunk.columns]]
+            if file_format == 'csv':
+                out.write(chunk.to_csv(index=False, header=(rows_written == 0)).encode('utf-8'))
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(out, table.schema)
+                parquet_writer.write_table(table.cast(parquet_writer.schema))
+            rows_written += len(chunk)
+
+    if parquet_writer is not None:
+        parquet_writer.close()
+    print(f"Exported {rows_written} rows as {file_format}")
+    return rows_written
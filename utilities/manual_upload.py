@@ -80,7 +80,8 @@ def handle_manual_upload() -> None:
                         )
 
                         # Call run_pipeline directly, to process the newly uploaded files
-                        run_pipeline()
+                        if not run_pipeline():
+                            raise RuntimeError("the load did not complete, see the pipeline logs")
                         
                         progress_bar.progress(1.0)
                         set_message(
@@ -0,0 +1,116 @@
+from pathlib import Path
+from utilities.config import DATA_DIR
+
+# Storage backends: PostgreSQL (default), or an embedded DuckDB/SQLite file for offline runs and CI.
+# Everything dialect-specific in the load step goes through the helpers below; the dashboard
+# queries only use SQL that all three understand. SQLAlchemy is imported inside the helpers
+# so utilities.DB_connection can use this module without slowing down CLI startup.
+
+LOCAL_BACKENDS = {
+    "duckdb": "skylink.duckdb",
+    "sqlite": "skylink.sqlite",
+}
+
+
+def local_database_url(backend: str, db_path: str = None) -> str:
+    """Build the URL of an embedded database file (defaults to data/skylink.<backend>)."""
+    if backend not in LOCAL_BACKENDS:
+        raise ValueError(f"Unsupported local backend '{backend}'. Choose one of: {', '.join(LOCAL_BACKENDS)}")
+    path = Path(db_path) if db_path else DATA_DIR / LOCAL_BACKENDS[backend]
+    return f"{backend}:///{path.resolve()}"
+
+
+def ensure_local_database_dir(database_url: str) -> None:
+    """Create the parent folder of an embedded database file, which DuckDB/SQLite will not do."""
+    for backend in LOCAL_BACKENDS:
+        prefix = f"{backend}:///"
+        if database_url.startswith(prefix) and database_url[len(prefix):] not in ("", ":memory:"):
+            Path(database_url[len(prefix):]).parent.mkdir(parents=True, exist_ok=True)
+    return None
+
+
+def _duckdb_connection(conn):
+    # The raw DuckDB connection behind the SQLAlchemy one (same transaction)
+    return conn.connection.driver_connection
+
+
+def row_id_column(conn) -> str:
+    """Physical row identifier used to tell duplicate rows apart."""
+    return 'ctid' if conn.dialect.name == 'postgresql' else 'rowid'
+
+
+def date_expr(conn, column: str) -> str:
+    """SQL for the calendar day of a timestamp column (SQLite keeps timestamps as ISO text)."""
+    return f'date({column})' if conn.dialect.name == 'sqlite' else f'CAST({column} AS DATE)'
+
+
+def floor_expr(conn, expr: str) -> str:
+    """SQL for floor(expr) as an integer; SQLite's FLOOR() is a compile-time option, so spell it out there."""
+    if conn.dialect.name == 'sqlite':
+        return f'(CAST({expr} AS INTEGER) - ({expr} < CAST({expr} AS INTEGER)))'
+    return f'CAST(FLOOR({expr}) AS BIGINT)'
+
+
+def table_columns(conn, table_name: str) -> list:
+    # Read from an empty result rather than reflection, which duckdb-engine cannot do for columns
+    return list(conn.exec_driver_sql(f'SELECT * FROM "{table_name}" LIMIT 0').keys())
+
+
+def has_index(conn, table_name: str, index_name: str) -> bool:
+    from sqlalchemy import inspect, text
+    if conn.dialect.name == 'duckdb':
+        # duckdb-engine cannot reflect indexes, so ask DuckDB's catalog directly
+        found = conn.execute(
+            text("SELECT 1 FROM duckdb_indexes() WHERE table_name = :table AND index_name = :index"),
+            {"table": table_name, "index": index_name}
+        ).first()
+        return found is not None
+    return index_name in {index['name'] for index in inspect(conn).get_indexes(table_name)}
+
+
+def create_table_from_frame(conn, table_name: str, df) -> None:
+    """Create `table_name` holding the rows of `df`."""
+    if conn.dialect.name == 'duckdb':
+        # Columnar bulk ingest: DuckDB scans the DataFrame in place instead of binding row by row
+        raw = _duckdb_connection(conn)
+        raw.register('frame_to_load', df)
+        try:
+            raw.execute(f'CREATE TABLE "{table_name}" AS SELECT * FROM frame_to_load')
+        finally:
+            raw.unregister('frame_to_load')
+        return None
+    df.to_sql(table_name, conn, index=False)
+    return None
+
+
+def _on_conflict_do_nothing(key_columns):
+    """pandas to_sql method: INSERT ... ON CONFLICT (key) DO NOTHING for PostgreSQL and SQLite."""
+    def insert_rows(table, conn, keys, data_iter):
+        if conn.dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        from sqlalchemy import literal_column
+        rows = [dict(zip(keys, row)) for row in data_iter]
+        # executemany lets SQLAlchemy batch the rows ("insertmanyvalues"); RETURNING counts the ones kept
+        statement = insert(table.table).on_conflict_do_nothing(index_elements=key_columns).returning(literal_column('1'))
+        return len(conn.execute(statement, rows).all())
+    return insert_rows
+
+
+def insert_ignoring_duplicates(conn, table_name: str, df, key_columns) -> int:
+    """Append `df` to `table_name`, skipping rows whose key is already stored. Returns rows inserted."""
+    if conn.dialect.name == 'duckdb':
+        raw = _duckdb_connection(conn)
+        raw.register('frame_to_load', df)
+        try:
+            inserted = raw.execute(
+                f'INSERT INTO "{table_name}" BY NAME SELECT * FROM frame_to_load ON CONFLICT DO NOTHING'
+            ).fetchone()
+        finally:
+            raw.unregister('frame_to_load')
+        return int(inserted[0]) if inserted else 0
+    return df.to_sql(
+        table_name, conn, if_exists='append', index=False,
+        method=_on_conflict_do_nothing(key_columns), chunksize=5_000
+    ) or 0
@@ -18,6 +18,22 @@ def read_df(data_path: str) -> pd.DataFrame:
     except Exception as e:
         print(f"An error occurred while reading the file: {e}")
         return pd.DataFrame()  # Return an empty DataFrame in case of error
+
+
+def read_df_chunks(data_path: str, chunksize: int):
+    """
+        Reads a given file in chunks of `chunksize` rows,
+        yields pandas DataFrames (Excel files are read whole as a single chunk).
+        Errors are raised rather than swallowed so a partial stream is never mistaken for a full one.
+    """
+    if data_path.endswith('.csv'):
+        yield from pd.read_csv(data_path, chunksize=chunksize)
+    elif data_path.endswith('.json'):
+        yield from pd.read_json(data_path, lines=True, chunksize=chunksize)
+    elif data_path.endswith('.xlsx') or data_path.endswith('.xls'):
+        yield pd.read_excel(data_path)
+    else:
+        raise ValueError("Unsupported file format. Please provide a CSV, Excel, or JSON file.")
     
     
 # function to execute SQL queries using a given psycopg2 connection